@@ -1,21 +1,22 @@
+import functools
 import numpy as np
 from typing import Iterator
 
-# Optional
-SCIPY = True
-try:
-    from scipy.signal import convolve2d
-except ImportError:
-    SCIPY = False
-
 CoordT = tuple[int, int]
 
+# (rows, columns) -> (neighbour table, neighbour count), shared by every board of the same shape
+_NEIGHBOUR_TABLES: dict[tuple[int, int], tuple[np.ndarray, np.ndarray]] = {}
+# (rows, columns) -> (row of, column of) every flatten index, as lists for fast scalar lookups
+_COORDINATE_TABLES: dict[tuple[int, int], tuple[list[int], list[int]]] = {}
+
 
 class Board:
     def __init__(self, rows: int, columns: int):
         self.rows = rows
         self.columns = columns
         self.board = self.create_board()
+        self._neigh, self._ncount = self._build_neighbour_table(rows, columns)
+        self._row_of, self._col_of = self._build_coordinate_table(rows, columns)  # flatten index -> row, column
 
     def __repr__(self):
         return repr(self.board)
@@ -26,15 +27,49 @@ class Board:
 
         return np.zeros((self.rows, self.columns), dtype=np.int8)  # create a board with zeros
 
+    @staticmethod
+    def _build_neighbour_table(rows: int, columns: int) -> tuple[np.ndarray, np.ndarray]:
+        """Get the flatten indices of the adjacent cells of every cell, for a board of the given shape.
+
+        Returns a (rows * columns, 8) table, valid neighbours first and padded with -1,
+        alongside the number of valid neighbours of every cell. Cached per board shape.
+        """
+
+        key = (rows, columns)
+        if key not in _NEIGHBOUR_TABLES:
+            row, col = np.divmod(np.arange(rows * columns), columns)
+            drows = np.array([-1, -1, -1, 0, 0, 1, 1, 1])
+            dcols = np.array([-1, 0, 1, -1, 1, -1, 0, 1])
+            adj_rows, adj_cols = row[:, None] + drows, col[:, None] + dcols  # adjacent cells
+
+            valid = (0 <= adj_rows) & (adj_rows < rows) & (0 <= adj_cols) & (adj_cols < columns)
+            neighbours = np.where(valid, adj_rows * columns + adj_cols, -1)
+            # move valid neighbours to the front, keeping their order
+            order = np.argsort(~valid, axis=1, kind="stable")
+
+            _NEIGHBOUR_TABLES[key] = (np.take_along_axis(neighbours, order, axis=1).astype(np.int32),
+                                      np.count_nonzero(valid, axis=1).astype(np.int8))
+        return _NEIGHBOUR_TABLES[key]
+
+    @staticmethod
+    def _build_coordinate_table(rows: int, columns: int) -> tuple[list[int], list[int]]:
+        """Get the row and the column of every flatten index, for a board of the given shape. Cached per board shape."""
+
+        key = (rows, columns)
+        if key not in _COORDINATE_TABLES:
+            row, col = np.divmod(np.arange(rows * columns), columns)
+            _COORDINATE_TABLES[key] = (row.tolist(), col.tolist())
+        return _COORDINATE_TABLES[key]
+
+    def get_adjacent_coords_flat(self, number: int) -> np.ndarray:
+        """Get the flatten indices of adjacent cell given a flatten index."""
+
+        return self._neigh[number, :self._ncount[number]]
+
     def get_adjacent_coords(self, coordinate: CoordT) -> Iterator[CoordT]:
         """Get the coordinates of row and column of adjacent cell given a coordinate."""
 
-        for drow in range(-1, 2):  # -1, 0, 1
-            for dcol in range(-1, 2):  # -1, 0, 1
-                row, col = coordinate[0] + drow, coordinate[1] + dcol  # adjacent cell
-
-                if 0 <= row < self.rows and 0 <= col < self.columns and (drow, dcol) != (0, 0):
-                    yield row, col
+        yield from map(self.number_to_coords, self.get_adjacent_coords_flat(self.coords_to_number(coordinate)))
 
     def coords_to_number(self, coordinate: CoordT) -> int:
         """Translate a 2d coordinate into a flatten index"""
@@ -44,12 +79,20 @@ class Board:
     def number_to_coords(self, number: int) -> CoordT:
         """Translate the index of the flatten list into a 2d coordinate """
 
-        return divmod(number, self.columns)
+        return self._row_of[number], self._col_of[number]
 
+    def _flat_nonzero(self, mask: np.ndarray) -> np.ndarray:
+        """Get the flatten indices of the truthy cells of a board shaped mask"""
+
+        return np.flatnonzero(mask.ravel())
+
+    def _iter_coords(self, mask: np.ndarray) -> Iterator[CoordT]:
+        """Get the coordinates of the truthy cells of a board shaped mask"""
+
+        return map(self.number_to_coords, self._flat_nonzero(mask))
 
-class MinesweeperBoard(Board):
-    MINES_EDGE_DETECTION_KERNEL = np.ones((3, 3), dtype=np.int8) * -1
 
+class MinesweeperBoard(Board):
     def __init__(self, rows: int, columns: int, mines: int | float, *, starting_tile: CoordT = None, seed=None):
         """Create a minesweeper board
 
@@ -63,6 +106,7 @@ class MinesweeperBoard(Board):
 
         super().__init__(rows, columns)
         self.rng = np.random.default_rng(seed)
+        self.mines_mask: np.ndarray | None = None  # set on generation
 
         if 0 < mines < 1:  # convert mine density to mines
             self.mines = max(1, int(mines * self.rows * self.columns))  # min 1 mine
@@ -77,85 +121,132 @@ class MinesweeperBoard(Board):
 
         self.generate_board()
 
-    def get_randomized_coords_for_mines(self, n: int) -> Iterator[CoordT]:
-        """Get randomized coordinates for mine placements, will exclude starting position and the adjacent tiles to it."""
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _make_index_pool(rows: int, columns: int) -> np.ndarray:
+        """Get the flatten indices of every cell of a board, read only. Cached per board shape."""
+
+        pool = np.arange(rows * columns, dtype=np.int32)
+        pool.flags.writeable = False
+        return pool
+
+    def get_randomized_mine_indices(self, n: int) -> np.ndarray:
+        """Get randomized flatten indices for mine placements, will exclude starting position and the adjacent tiles to it."""
 
-        cell_num = list(range(self.rows * self.columns))  # get position in 1d space
+        pool = self._make_index_pool(self.rows, self.columns).copy()
 
-        cell_num.remove(self.coords_to_number(self.starting_tile))  # exclude starting position
-        for coord in self.get_adjacent_coords(self.starting_tile):  # exclude the tiles adjacent to the starting position
-            cell_num.remove(self.coords_to_number(coord))
+        # exclude starting position and the tiles adjacent to it by swapping them to the tail of the pool
+        start = self.coords_to_number(self.starting_tile)
+        excluded = np.append(self.get_adjacent_coords_flat(start), start)
+        head = pool.size - excluded.size
+        # the pool is in order, so a cell's index is also its position in the pool
+        pool[excluded[excluded < head]] = np.setdiff1d(pool[head:], excluded, assume_unique=True)
 
-        # get random position and convert to 2d coordinates
-        yield from map(self.number_to_coords, self.rng.choice(cell_num, size=n, replace=False))
+        return self.rng.choice(pool[:head], size=n, replace=False)
+
+    def get_randomized_coords_for_mines(self, n: int) -> np.ndarray:
+        """Get randomized coordinates for mine placements, as an array of (row, column) pairs."""
+
+        return np.column_stack(np.divmod(self.get_randomized_mine_indices(n), self.columns))
 
     def generate_board(self) -> None:
-        if SCIPY:
-            self.convol_generation()
-        else:
-            self.linear_generation()
+        self.convol_generation()
 
     def linear_generation(self) -> None:
         """Generate a board with mines and markings. For loops implementation"""
 
-        for coord in self.get_randomized_coords_for_mines(self.mines):
-            self.board[coord] = -1
-            for coord in self.get_adjacent_coords(coord):
-                if self.board[coord] != -1:
-                    self.board[coord] += 1
+        mine_indices = self.get_randomized_mine_indices(self.mines)
+        board = self.board.reshape(-1)  # flatten view
+        for cell in mine_indices:
+            board[cell] = -1
+            for adj in self.get_adjacent_coords_flat(cell):
+                if board[adj] != -1:
+                    board[adj] += 1
+
+        # cached, the mines never move after generation
+        self.mines_mask = np.zeros((self.rows, self.columns), dtype=bool)
+        self.mines_mask.flat[mine_indices] = True
 
     def convol_generation(self) -> None:  # 4x faster than for loops implementation, not that it really matters, it's just cool
-        """Generate a board with mines and markings. Matrix convolution implementation"""
+        """Generate a board with mines and markings. Matrix convolution implementation
 
-        # add mines
-        for coord in self.get_randomized_coords_for_mines(self.mines):
-            self.board[coord] = -1
+        The 3x3 kernel is all ones, so the convolution is done as a sum of the 9 shifted views of a zero padded board.
+        """
 
-        mines_positions = self.board == -1
-        marked_tiles = convolve2d(self.board, self.MINES_EDGE_DETECTION_KERNEL, mode="same")
+        # add mines
+        mines_positions = np.zeros((self.rows, self.columns), dtype=bool)
+        mines_positions.flat[self.get_randomized_mine_indices(self.mines)] = True
+
+        padded = np.zeros((self.rows + 2, self.columns + 2), dtype=np.int8)
+        padded[1:-1, 1:-1] = mines_positions
+        # count mines in the 3x3 area around every tile, then take away the tile itself
+        marked_tiles = sum(padded[drow:drow + self.rows, dcol:dcol + self.columns]
+                           for drow in range(3) for dcol in range(3)) - padded[1:-1, 1:-1]
         # for spot that is mine, set -1, else keep
-        self.board = np.where(mines_positions, -1, marked_tiles)
+        marked_tiles = marked_tiles.astype(np.int8, copy=False)
+        marked_tiles[mines_positions] = -1
+        self.board = marked_tiles
+        self.mines_mask = mines_positions  # cached, the mines never move after generation
 
     def get_all_mine_coords(self) -> Iterator[CoordT]:
-        return zip(*np.where(self.board == -1))
+        return self._iter_coords(self.mines_mask)
 
 
 class TileBoard(Board):
+    # bits of self.state
+    OPENED = np.uint8(0b01)
+    FLAGGED = np.uint8(0b10)
+
     def __init__(self, rows: int, columns: int):
         """Used to generate visual board for playing
 
         Created to store tile states (open, flagged) when playing
         self.board: store tile values as the game goes on
-        self.opened: tile is opened or not
-        self.flagged: tile is flagged or not
+        self.state: tile states packed as bits, OPENED and FLAGGED. 0 is a closed tile.
+                    A view into a board padded with a border of opened tiles, see create_state_board
+        self.opened: tile is opened or not, read only
+        self.flagged: tile is flagged or not, read only
         """
 
         super().__init__(rows, columns)
 
-        # Create arrays with all 0, switch to 1 to denote truthy
-        self.opened: np.ndarray = self.create_bool_board()
-        self.flagged: np.ndarray = self.create_bool_board()
+        self._padded_state: np.ndarray = self.create_state_board()
+        self.state: np.ndarray = self._padded_state[1:-1, 1:-1]
+        self._opened_count = 0  # number of opened tiles, kept in step with the OPENED bits
+
+    def create_state_board(self) -> np.ndarray:
+        """Create the state board with a 1 tile border around it, so can_look_around can take a fixed 3x3 slice without clamping.
+        The border is only OPENED, so it never counts as a flag"""
+
+        state = np.full((self.rows + 2, self.columns + 2), self.OPENED, dtype=np.uint8)
+        state[1:-1, 1:-1] = 0
+        return state
 
-    def create_bool_board(self) -> np.ndarray:
-        return np.zeros((self.rows, self.columns), dtype=bool)
+    @property
+    def opened(self) -> np.ndarray:
+        return (self.state & self.OPENED) != 0
+
+    @property
+    def flagged(self) -> np.ndarray:
+        return (self.state & self.FLAGGED) != 0
 
     def is_opened(self, coord: CoordT) -> bool:
-        return self.opened[coord]
+        return bool(self.state[coord] & self.OPENED)
 
     def is_flagged(self, coord: CoordT) -> bool:
-        return self.flagged[coord]
+        return bool(self.state[coord] & self.FLAGGED)
 
     def get_all_opened_coords(self) -> Iterator[CoordT]:
-        return zip(*np.where(self.opened))
+        return self._iter_coords(self.opened)
 
     def get_all_flagged_coords(self) -> Iterator[CoordT]:
-        return zip(*np.where(self.flagged))
+        return self._iter_coords(self.flagged)
 
     def flag_tile(self, coord: CoordT) -> None:
-        self.flagged[coord] = True
+        self.state[coord] |= self.FLAGGED
 
     def unflag_tile(self, coord: CoordT) -> None:
-        self.flagged[coord] = False
+        self.state[coord] &= ~self.FLAGGED
 
 
 class GameBoard(TileBoard):
@@ -169,6 +260,13 @@ class GameBoard(TileBoard):
     def start_game(self, coord: CoordT) -> None:
         self.generate_minesweeper_board(coord)
 
+    def reset(self) -> None:
+        """Clear the board for a new game with the same settings"""
+        self.board.fill(0)
+        self.state.fill(0)
+        self._opened_count = 0
+        self.minesweeper = None
+
     def click_tile(self, coord: CoordT) -> None:
         """When a tile is clicked, do stuff based on the tile state"""
         if self.minesweeper is None:  # not initialised yet
@@ -178,51 +276,82 @@ class GameBoard(TileBoard):
             return
 
         if not self.is_opened(coord):
-            self.open_tile(coord)
-
-            if self.board[coord] == 0:  # no mines around
-                self.cascade_tile(coord)
+            self.reveal_tile(coord)
         else:
             if self.can_look_around(coord):
                 self.cascade_tile(coord)
 
-        if self.board[coord] == -1:  # pressed mine
-            self.game_over(coord)
-
         if self.is_win():
             self.win()
 
+    def reveal_tile(self, coord: CoordT) -> None:
+        """Open a tile, and every tile connected to it through tiles with no mines around"""
+        if self.minesweeper.board[coord] == 0:  # no mines around
+            self._flood_open(self.coords_to_number(coord))
+        else:
+            self.open_tile(coord)
+
+        if self.board[coord] == -1:  # pressed mine
+            self.game_over(coord)
+
     def game_over(self, coord: CoordT) -> None:
         """Reveal all mines"""
-        mines = self.minesweeper.board == -1
-        self.board = np.where(mines, -1, self.board)
+        self.board[self.minesweeper.mines_mask] = -1
 
     def win(self) -> None:
         """Flag all mines"""
-        for mine_coord in self.minesweeper.get_all_mine_coords():
-            self.flag_tile(mine_coord)
+        self.state[self.minesweeper.mines_mask] |= self.FLAGGED
 
     def cascade_tile(self, coord) -> None:
-        for coord in self.get_adjacent_unopened_and_unflagged_coords(coord):
-            self.click_tile(coord)
+        for number in self.get_adjacent_coords_flat(self.coords_to_number(coord)):
+            if self.state.flat[number]:  # opened or flagged
+                continue
+            self.reveal_tile(self.number_to_coords(number))
+
+    def _flood_open(self, start: int) -> None:
+        """Iterative flood fill from an empty tile, given as a flatten index.
+        Every tile reached is opened at once after the fill."""
+
+        visited = {start}
+        stack = [start]
+        while stack:
+            number = stack.pop()
+            if self.minesweeper.board.flat[number] != 0:  # numbered tile, stop spreading
+                continue
+
+            for adj in self.get_adjacent_coords_flat(number).tolist():
+                if adj in visited or self.state.flat[adj]:  # opened or flagged
+                    continue
+                visited.add(adj)
+                stack.append(adj)
+
+        self.open_tiles(np.fromiter(visited, dtype=np.intp, count=len(visited)))
 
     def generate_minesweeper_board(self, starting_tile: CoordT, seed=None) -> None:
         self.minesweeper = MinesweeperBoard(self.rows, self.columns, self.mines, starting_tile=starting_tile, seed=seed)
 
     def is_win(self) -> bool:
         """Check if the number of non opened cells is equal to number of mines"""
-        return np.count_nonzero(self.opened == 0) == self.mines
+        return self._opened_count == self.rows * self.columns - self.mines
 
     def open_tile(self, coord: CoordT) -> None:
         """"Open" a tile and set its value to its respective tile type. Ideally called once per tile."""
         self.board[coord] = self.minesweeper.board[coord]
-        self.opened[coord] = True
+        if not self.is_opened(coord):
+            self.state[coord] |= self.OPENED
+            self._opened_count += 1
+
+    def open_tiles(self, numbers: np.ndarray) -> None:
+        """"Open" multiple tiles at once, given their flatten indices."""
+        self.board.flat[numbers] = self.minesweeper.board.flat[numbers]
+        self._opened_count += np.count_nonzero(~self.state.flat[numbers] & self.OPENED)
+        self.state.flat[numbers] |= self.OPENED
 
     def get_adjacent_unopened_and_unflagged_coords(self, coord: CoordT) -> Iterator[CoordT]:
         """Used to cascade tiles and "look around" tiles"""
 
         for coord in self.get_adjacent_coords(coord):
-            if self.is_opened(coord) or self.is_flagged(coord):
+            if self.state[coord]:  # opened or flagged
                 continue
             yield coord
 
@@ -233,10 +362,13 @@ class GameBoard(TileBoard):
 
     def can_look_around(self, coord: CoordT) -> bool:
         """See if the number on the tile is less than the number of adjacent flags"""
-        return self.board[coord] <= len(tuple(self.get_adjacent_flagged_coords(coord)))
+        row, col = coord
+        # flags in the 3x3 area around the tile, minus the tile itself. The padded board is offset by 1 tile
+        flags = np.count_nonzero(self._padded_state[row:row + 3, col:col + 3] & self.FLAGGED) - self.is_flagged(coord)
+        return self.board[coord] <= flags
 
     def get_wrong_flag_coords(self) -> Iterator[CoordT]:
-        mines = self.minesweeper.board == -1
+        mines = self.minesweeper.mines_mask
 
         # using an A AND NOT B logic gate
         #  flag   mines   out
@@ -244,10 +376,10 @@ class GameBoard(TileBoard):
         #   0      1       0
         #   1      0       1
         #   1      1       0
-        return zip(*np.where(self.flagged & ~mines))
+        return self._iter_coords(self.flagged & ~mines)
 
     def get_unflagged_mine_coords(self) -> Iterator[CoordT]:
-        mines = self.minesweeper.board == -1
+        mines = self.minesweeper.mines_mask
 
         # using a NOT A AND B logic gate
         #  flag   mines   out
@@ -255,4 +387,4 @@ class GameBoard(TileBoard):
         #   0      1       1
         #   1      0       0
         #   1      1       0
-        return zip(*np.where(~self.flagged & mines))
+        return self._iter_coords(~self.flagged & mines)
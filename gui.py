@@ -1,16 +1,54 @@
 from tkinter import *
 from board import GameBoard
 import numpy as np
-from datetime import timedelta
+from time import monotonic
 
+import functools
 import sys
 from typing import Callable, Literal
 
-LEFT_CLICK = "<Button-1>"
-RIGHT_CLICK = "<Button-2>" if sys.platform == 'darwin' else "<Button-3>"
+LEFT_CLICK = "<ButtonPress-1>"
+RIGHT_CLICK = "<ButtonPress-2>" if sys.platform == 'darwin' else "<ButtonPress-3>"
+TILE_SIZE = 25  # width and height of a tile image, in pixels
+# largest board that can be requested
+MAX_ROWS = 50
+MAX_COLUMNS = 100
+MAX_MINES = int(0.35 * MAX_ROWS * MAX_COLUMNS)
+# image shown on a tile, 0 to 8 are the numbered tiles
+STATE_CLOSED, STATE_FLAG, STATE_FLAG_WRONG, STATE_MINE, STATE_MINE_RED = range(9, 14)
+# state of an opened tile, indexed by its tile type. -1 (mine) wraps around to the last item
+TILE_TYPE_STATES = (*range(9), STATE_MINE_RED)
 CoordT = tuple[int, int]
 
 
+@functools.lru_cache(maxsize=None)
+def _load_images() -> dict:
+    """Load the tile images once and share them between boards. Needs a Tk root to exist first.
+    The cache also keeps them referenced, so they don't get garbage collected and cleared by Tk."""
+
+    return {
+        "closed": PhotoImage(file="./img/closed.png"),
+        "opened": PhotoImage(file="./img/opened.png"),
+        "flag": PhotoImage(file="./img/flag.png"),
+        "flag_wrong": PhotoImage(file="./img/flag_wrong.png"),
+        "mine": PhotoImage(file="./img/mine.png"),
+        "mine_red": PhotoImage(file="./img/mine_red.png"),
+        "tile": _load_sprite_sheet("./img/tiles.png", 9)
+    }
+
+
+def _load_sprite_sheet(file: str, count: int) -> list[PhotoImage]:
+    """Load a sheet of tiles placed side by side, and cut it into a separate image for each tile"""
+
+    sheet = PhotoImage(file=file)
+    tiles = []
+    for n in range(count):
+        tile = PhotoImage(width=TILE_SIZE, height=TILE_SIZE)
+        tile.tk.call(tile, "copy", sheet, "-from", n * TILE_SIZE, 0, (n + 1) * TILE_SIZE, TILE_SIZE)
+        tiles.append(tile)
+    return tiles
+
+
 class BoardGUI(Frame, GameBoard):
     def __init__(self, tk, rows: int, columns: int, mines: int, seed=None):
         super().__init__(tk)
@@ -19,22 +57,25 @@ class BoardGUI(Frame, GameBoard):
         self.PLAYING = True
         self.seed = seed
 
-        self.images = {
-            "closed": PhotoImage(file="./img/closed.png"),
-            "opened": PhotoImage(file="./img/opened.png"),
-            "flag": PhotoImage(file="./img/flag.png"),
-            "flag_wrong": PhotoImage(file="./img/flag_wrong.png"),
-            "mine": PhotoImage(file="./img/mine.png"),
-            "mine_red": PhotoImage(file="./img/mine_red.png"),
-            "tile": [
-                PhotoImage(file=f"./img/{n}.png") for n in range(0, 9)
-            ]
+        self.images = _load_images()
+        # what a right click does, by tile state
+        self._right_click_actions: dict[int, Callable[[CoordT], None]] = {
+            0: self.flag_tile,
+            int(self.FLAGGED): self.unflag_tile,
         }
 
-        self.button_frame = Frame(self)
-        self.buttons = self.create_button_board(self.button_frame)
+        # image of each tile state, indexed by the STATE_* values
+        self._state_images = (*self.images["tile"], self.images["closed"], self.images["flag"],
+                              self.images["flag_wrong"], self.images["mine"], self.images["mine_red"])
+        self._tile_state = np.full((self.rows, self.columns), STATE_CLOSED, dtype=np.uint8)  # image each tile will show
+        self._pending_redraw: list[CoordT] = []  # tiles with image changes waiting to be sent to Tk
+        self.canvas = Canvas(self, width=self.columns * TILE_SIZE, height=self.rows * TILE_SIZE, highlightthickness=0)
+        self.items = self.create_tile_items()
+        self.bind_clicks()
 
         self.time = 0  # time in seconds
+        self._timer_job: str | None = None  # id of the next scheduled timer update
+        self._map_funcid = self.winfo_toplevel().bind("<Map>", self._on_map, add="+")
         self.timer = Label(self, text="0:00:00", font=("Arial", 12))
 
         self.display()
@@ -43,84 +84,180 @@ class BoardGUI(Frame, GameBoard):
         """Display the board and the timer"""
 
         self.timer.pack()
-        self.button_frame.pack()
+        self.canvas.pack()
 
-    def create_button_board(self, tk) -> np.ndarray:
-        ar = np.empty((self.rows, self.columns), dtype=object)
+    def create_tile_items(self) -> np.ndarray:
+        """Draw a closed tile image item on the canvas for every tile, returns the item ids"""
+
+        ar = np.empty((self.rows, self.columns), dtype=np.int32)
         closed_image = self.images["closed"]
 
-        def left_click(row, col) -> Callable:
-            coord = (row, col)
+        for row in range(self.rows):
+            for col in range(self.columns):
+                ar[row, col] = self.canvas.create_image(col * TILE_SIZE, row * TILE_SIZE, anchor=NW, image=closed_image, tags="tile")
+        return ar
 
-            def func(event):
-                if not self.PLAYING:
-                    return
+    def event_to_coords(self, event) -> CoordT | None:
+        """Translate the position of a mouse event on the canvas into the coordinate of the tile under it"""
 
-                self.click_tile(coord)
+        row, col = event.y // TILE_SIZE, event.x // TILE_SIZE
+        if 0 <= row < self.rows and 0 <= col < self.columns:
+            return row, col
+        return None
 
-            return func
+    def bind_clicks(self) -> None:
+        self.canvas.bind(LEFT_CLICK, self._on_left_click)
+        self.canvas.bind(RIGHT_CLICK, self._on_right_click)
 
-        def right_click(row, col) -> Callable:
-            coord = (row, col)
+    def unbind_clicks(self) -> None:
+        """Stop reacting to clicks on the board, Tk drops them without calling back into Python"""
 
-            def func(event):
-                if not self.PLAYING or self.is_opened(coord):
-                    return
+        self.canvas.unbind(LEFT_CLICK)
+        self.canvas.unbind(RIGHT_CLICK)
 
-                if not self.is_flagged(coord):
-                    self.flag_tile(coord)
-                else:
-                    self.unflag_tile(coord)
+    def _on_left_click(self, event) -> None:
+        coord = self.event_to_coords(event)
+        if coord is None:
+            return
 
-            return func
+        self.click_tile(coord)
 
-        for row in range(self.rows):
-            for col in range(self.columns):
-                button = Button(tk, image=closed_image, width=25, height=25)
-                button.bind(LEFT_CLICK, left_click(row, col))
-                button.bind(RIGHT_CLICK, right_click(row, col))
-                button.grid(row=row, column=col)
+    def _on_right_click(self, event) -> None:
+        coord = self.event_to_coords(event)
+        if coord is None:
+            return
 
-                ar[row, col] = button
-        return ar
+        action = self._right_click_actions.get(self.state[coord])  # nothing to do on opened tiles
+        if action is not None:
+            action(coord)
+
+    def _queue_redraw(self, coord: CoordT, state: int) -> None:
+        """Record an image change for a tile, applied when Tk is next idle. Changes to the image already shown are skipped"""
+
+        if self._tile_state[coord] == state:
+            return
+
+        self._tile_state[coord] = state
+        if not self._pending_redraw:  # first change since the last flush
+            self.after_idle(self._flush_redraws)
+        self._pending_redraw.append(coord)
+
+    def _queue_redraw_mask(self, mask: np.ndarray, state: int) -> None:
+        """Record an image change for every tile of a board shaped mask, see _queue_redraw"""
+
+        mask = mask & (self._tile_state != state)
+        if not mask.any():
+            return
+
+        self._tile_state[mask] = state
+        if not self._pending_redraw:  # first change since the last flush
+            self.after_idle(self._flush_redraws)
+        self._pending_redraw.extend(map(tuple, np.argwhere(mask)))
+
+    def _flush_redraws(self) -> None:
+        """Send all recorded image changes to Tk at once, after the game state is done changing"""
+
+        for coord in self._pending_redraw:
+            self.canvas.itemconfigure(int(self.items[coord]), image=self._state_images[self._tile_state[coord]])
+        self._pending_redraw.clear()
+
+    def show_tile(self, coord: CoordT) -> None:
+        """Set the picture of an opened tile"""
+
+        self._queue_redraw(coord, TILE_TYPE_STATES[self.board[coord]])
 
     def open_tile(self, coord: CoordT) -> None:
         super().open_tile(coord)
+        self.show_tile(coord)
 
-        # set the picture
-        tile_type = self.board[coord]
-        if tile_type == -1:
-            image = self.images["mine_red"]
-        else:
-            image = self.images["tile"][tile_type]
-        self.buttons[coord].configure(image=image)
+    def open_tiles(self, numbers: np.ndarray) -> None:
+        super().open_tiles(numbers)
+        for number in numbers:
+            self.show_tile(self.number_to_coords(number))
 
     def start_game(self, coord: CoordT) -> None:
         super().start_game(coord)
         self.start_timer()
 
+    def reset(self) -> None:
+        """Start a new game on the same board, without recreating the canvas"""
+
+        super().reset()
+        self.PLAYING = True
+        self.bind_clicks()
+
+        self.cancel_timer()
+        self.time = 0
+        self.timer.configure(text="0:00:00")
+
+        self._pending_redraw.clear()
+        self._tile_state.fill(STATE_CLOSED)
+        self.canvas.itemconfigure("tile", image=self.images["closed"])  # every tile in one call
+
+    def destroy(self) -> None:
+        """Drop everything scheduled by or pointing at this board before its widgets go away.
+        The images are shared between boards and stay loaded, see _load_images"""
+
+        self.PLAYING = False
+        self.cancel_timer()
+        self._pending_redraw.clear()
+
+        # unbind(seq, funcid) clears every <Map> script of the toplevel before python 3.13, only drop this board's line
+        top = self.winfo_toplevel()
+        script = str(top.bind("<Map>"))
+        top.bind("<Map>", "\n".join(line for line in script.splitlines() if f"[{self._map_funcid} " not in line))
+        top.deletecommand(self._map_funcid)  # the Tcl command holding this board
+        super().destroy()
+
+    def cancel_timer(self) -> None:
+        if self._timer_job is not None:
+            self.timer.after_cancel(self._timer_job)
+            self._timer_job = None
+
     def start_timer(self) -> None:
-        def update_timer():
-            if self.PLAYING:
-                self.timer.configure(text=str(timedelta(seconds=self.time)))
-                self.time += 1
-                self.timer.after(1000, update_timer)
-        update_timer()
+        self._t0 = monotonic()
+        self._last_elapsed = -1
+        self.update_timer()
+
+    def update_timer(self) -> None:
+        self._timer_job = None
+        if not self.PLAYING:
+            return
+        if self.winfo_toplevel().state() == "iconic":  # minimized, stop ticking until the window is shown again
+            return
+
+        elapsed_ms = int((monotonic() - self._t0) * 1000)
+        self.time = elapsed_ms // 1000
+        if self.time != self._last_elapsed:  # only redraw when the shown second changes
+            self._last_elapsed = self.time
+            hours, rem = divmod(self.time, 3600)
+            minutes, seconds = divmod(rem, 60)
+            self.timer.configure(text=f"{hours}:{minutes:02d}:{seconds:02d}")
+        # schedule against the start time so the ticks don't drift
+        self._timer_job = self.timer.after(1000 - elapsed_ms % 1000, self.update_timer)
+
+    def _on_map(self, event) -> None:
+        """Resume the timer when the window is shown again, the time spent minimized still counts"""
+
+        if event.widget is self.winfo_toplevel() and self.minesweeper is not None and self._timer_job is None:
+            self.update_timer()
 
     def flag_tile(self, coord: CoordT) -> None:
         super().flag_tile(coord)
-        self.buttons[coord].configure(image=self.images["flag"])
+        self._queue_redraw(coord, STATE_FLAG)
 
     def unflag_tile(self, coord: CoordT) -> None:
         super().unflag_tile(coord)
-        self.buttons[coord].configure(image=self.images["closed"])
+        self._queue_redraw(coord, STATE_CLOSED)
 
     def win(self) -> None:
         """Win game and flag all unflagged mines"""
 
         self.PLAYING = False
-        for mine_coord in self.get_unflagged_mine_coords():
-            self.flag_tile(mine_coord)
+        self.unbind_clicks()
+
+        super().win()
+        self._queue_redraw_mask(self.minesweeper.mines_mask, STATE_FLAG)
 
     def game_over(self, coord: CoordT) -> None:
         """Lose game and show all other mines, also shows wrong flagged
@@ -128,17 +265,12 @@ class BoardGUI(Frame, GameBoard):
         """
 
         self.PLAYING = False
+        self.unbind_clicks()
 
-        red_mine_image = self.images["mine"]
-        for mine_coord in self.get_unflagged_mine_coords():
-            if mine_coord == coord:
-                continue
-
-            self.buttons[mine_coord].configure(image=red_mine_image)
-
-        wrong_flag_image = self.images["flag_wrong"]
-        for flag_coord in self.get_wrong_flag_coords():
-            self.buttons[flag_coord].configure(image=wrong_flag_image)
+        mines = self.minesweeper.mines_mask
+        # mines that are not flagged nor already opened, the clicked mines are opened
+        self._queue_redraw_mask(mines & (self.state == 0), STATE_MINE)
+        self._queue_redraw_mask(self.flagged & ~mines, STATE_FLAG_WRONG)
 
 
 class MainGUI(Frame):
@@ -192,32 +324,59 @@ class MainGUI(Frame):
     def set_mode(self, mode: Literal["Easy", "Intermediate", "Expert"]):
         match mode.casefold():
             case "easy":
-                self.rows.set(10)
-                self.columns.set(10)
-                self.mines.set(10)
+                rows, columns, mines = 10, 10, 10
             case "intermediate":
-                self.rows.set(16)
-                self.columns.set(16)
-                self.mines.set(40)
+                rows, columns, mines = 16, 16, 40
             case "expert":
-                self.rows.set(16)
-                self.columns.set(30)
-                self.mines.set(99)
-
-    def validate_mines(self):
-        area = self.rows.get() * self.columns.get()
-        mine_density = self.mines.get() / area
-        if mine_density < 0:
-            self.mines.set(int(0.1*area))
+                rows, columns, mines = 16, 30, 99
+            case _:
+                return
+
+        # clamp the preset before writing it, so each input is written at most once
+        self._write_settings(*self.clamp_settings(rows, columns, mines))
+
+    def validate_mines(self) -> tuple[int, int, int]:
+        """Clamp the board size and mines to sane limits, then keep the mine density between 10% and 35%"""
+
+        settings = self.clamp_settings(self.rows.get(), self.columns.get(), self.mines.get())
+        self._write_settings(*settings)
+        return settings
+
+    @staticmethod
+    def clamp_settings(rows: int, columns: int, mines: int) -> tuple[int, int, int]:
+        """Get the rows, columns and mines clamped to the limits enforced by validate_mines"""
+
+        rows = min(max(1, rows), MAX_ROWS)
+        columns = min(max(1, columns), MAX_COLUMNS)
+        mines = min(max(1, mines), MAX_MINES)
+
+        area = rows * columns
+        mine_density = mines / area
+        if mine_density < 0.1:
+            mines = int(0.1*area)
         elif mine_density > 0.35:
-            self.mines.set(int(0.35*area))
+            mines = int(0.35*area)
+
+        # leave room for the starting tile and the tiles around it, which never have mines
+        return rows, columns, min(mines, max(0, area - 9))
+
+    def _write_settings(self, rows: int, columns: int, mines: int) -> None:
+        """Write the settings to the inputs, skipping the ones that already hold the value"""
+
+        for var, value in ((self.rows, rows), (self.columns, columns), (self.mines, mines)):
+            if var.get() != value:
+                var.set(value)
 
     def load_board(self):
+        rows, columns, mines = self.validate_mines()
+
         if self.board:
+            if (self.board.rows, self.board.columns, self.board.mines) == (rows, columns, mines):  # same settings, reuse it
+                self.board.reset()
+                return self.board
             self.board.destroy()
 
-        self.validate_mines()
-        self.board = BoardGUI(self, self.rows.get(), self.columns.get(), self.mines.get())
+        self.board = BoardGUI(self, rows, columns, mines)
         self.board.pack()
         return self.board
 